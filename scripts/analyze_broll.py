@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+OUT_DIR = os.getenv("BROLL_DIR", "out/broll")
+VOICE_PATH = os.getenv("VOICE_PATH", "voice.mp3")
+WINDOWS_PATH = os.path.join(OUT_DIR, "windows.json")
+
+# frames chiquitos en gris: suficiente para brillo/movimiento, casi gratis
+THUMB_W = 64
+THUMB_H = 114  # ~9:16
+# Muestreo: a lo más SAMPLE_POINTS frames sueltos (seek + 1 frame), en
+# paralelo y con deadline. Si el clip tiene keyframes de sobra se usan
+# keyframes (seek exacto = decodificar 1 frame); si no, puntos parejos.
+SAMPLE_POINTS = 16
+SEEK_WORKERS = 4
+MIN_SAMPLES = 2
+ANALYZE_BUDGET_SEC = float(os.getenv("BROLL_ANALYZE_BUDGET", "0.8"))  # por clip
+
+DARK_FLOOR = 40.0      # luma media (0-255) debajo de esto ~ negro / fade
+MOTION_WEIGHT = 0.6
+
+def die(msg: str):
+    raise RuntimeError(msg)
+
+def probe_duration(path: str) -> float:
+    out = subprocess.check_output([
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=nk=1:nw=1", path
+    ])
+    try:
+        return float(out.decode().strip())
+    except ValueError:
+        return 0.0
+
+def keyframe_times(path: str, timeout: float) -> np.ndarray:
+    """
+    Timestamps de keyframes leyendo sólo paquetes (sin decodificar),
+    relativos al primero (lo que espera `-ss`). Vacío si no alcanza el tiempo.
+    """
+    try:
+        out = subprocess.run([
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path
+        ], capture_output=True, timeout=max(0.05, timeout), check=True).stdout.decode()
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
+        return np.array([])
+    ts = []
+    for line in out.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2 and "K" in parts[1]:
+            try:
+                ts.append(float(parts[0]))
+            except ValueError:
+                continue
+    ts = np.array(sorted(ts))
+    return ts - ts[0] if len(ts) else ts
+
+def decode_frame_at(path: str, t: float, timeout: float):
+    """Un solo frame en t (seek de entrada); None si no alcanza el tiempo."""
+    try:
+        raw = subprocess.run([
+            "ffmpeg", "-v", "error", "-ss", f"{t:.3f}", "-i", path, "-an",
+            "-frames:v", "1", "-vf", f"scale={THUMB_W}:{THUMB_H},format=gray",
+            "-f", "rawvideo", "-"
+        ], capture_output=True, timeout=max(0.05, timeout), check=True).stdout
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
+        return None
+    if len(raw) < THUMB_W * THUMB_H:
+        return None
+    return np.frombuffer(raw[: THUMB_W * THUMB_H], dtype=np.uint8).reshape(THUMB_H, THUMB_W)
+
+def sample_points(keyframes: np.ndarray, duration: float) -> np.ndarray:
+    """
+    Hasta SAMPLE_POINTS instantes parejos. Con keyframes de sobra son sólo
+    keyframes (cada seek decodifica un frame); con GOP largo se completan
+    con puntos parejos (cada seek decodifica desde el keyframe previo).
+    """
+    if len(keyframes) < SAMPLE_POINTS:
+        even = np.linspace(0, duration, SAMPLE_POINTS + 2)[1:-1]
+        keyframes = np.unique(np.concatenate([keyframes, even]))
+    idx = np.unique(np.linspace(0, len(keyframes) - 1, SAMPLE_POINTS).round().astype(int))
+    return keyframes[idx]
+
+def sample_clip(path: str, duration: float, deadline: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Todo bajo el mismo deadline: ffprobe de keyframes y los seeks. Nunca se
+    decodifica el stream completo (a 4K eso son segundos por clip); lo que
+    no termina a tiempo se descarta.
+    """
+    keyframes = keyframe_times(path, deadline - time.perf_counter())
+    points = sample_points(keyframes, duration) if duration > 0 else keyframes
+
+    pool = ThreadPoolExecutor(max_workers=SEEK_WORKERS)
+    try:
+        futures = {
+            pool.submit(decode_frame_at, path, float(t), deadline - time.perf_counter()): float(t)
+            for t in points
+        }
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    got = sorted((futures[f], f.result()) for f in done if f.result() is not None)
+    if not got:
+        return np.array([]), np.zeros((0, THUMB_H, THUMB_W), dtype=np.uint8)
+    return np.array([t for t, _ in got]), np.stack([fr for _, fr in got])
+
+def render_windows(visual_plan: list) -> list[float]:
+    """
+    Mismo largo que usa render.sh por clip: D1..D3 si vienen en env; si no,
+    DURATION/3 (DURATION = env o duración del audio). Sin audio todavía,
+    caemos a duration_sec del visual_plan.
+    """
+    duration = os.getenv("DURATION")
+    if not duration and os.path.exists(VOICE_PATH):
+        duration = probe_duration(VOICE_PATH)
+    if duration:
+        d = float(duration)
+        third = d / 3.0
+        defaults = [third, third, max(0.1, d - 2 * third)]
+    else:
+        print(f"[analyze] no DURATION/{VOICE_PATH}: sizing windows from visual_plan.duration_sec")
+        defaults = [float(b.get("duration_sec") or 14) for b in visual_plan]
+    return [float(os.getenv(f"D{i}") or defaults[i - 1]) for i in (1, 2, 3)]
+
+def best_window(ts: np.ndarray, frames: np.ndarray, duration: float, window: float) -> dict:
+    """
+    Score por muestra:
+    - brillo: penaliza negro/fade (satura en DARK_FLOOR, no premia "claro")
+    - movimiento: diferencia media con la muestra anterior
+    Score de ventana = promedio de las muestras que caen dentro.
+    """
+    if len(frames) == 0 or duration <= window:
+        return {"start": 0.0, "score": None}
+
+    f = frames.astype(np.float32)
+    luma = f.mean(axis=(1, 2))
+    bright = np.clip(luma / DARK_FLOOR, 0.0, 1.0)
+
+    motion = np.zeros(len(f), dtype=np.float32)
+    if len(f) > 1:
+        motion[1:] = np.abs(np.diff(f, axis=0)).mean(axis=(1, 2))
+        motion[0] = motion[1]
+    peak = motion.max()
+    motion = motion / peak if peak > 0 else motion
+
+    per_sample = bright + MOTION_WEIGHT * motion
+
+    # candidatos: 0 y cada muestra que deja ventana completa
+    starts = np.unique(np.concatenate([[0.0], ts[ts <= duration - window]]))
+    inside = (ts[None, :] >= starts[:, None]) & (ts[None, :] < starts[:, None] + window)
+    counts = inside.sum(axis=1)
+    scores = np.where(counts > 0, (inside @ per_sample) / np.maximum(counts, 1), -np.inf)
+
+    i = int(np.argmax(scores))
+    return {"start": round(float(starts[i]), 3), "score": round(float(scores[i]), 4)}
+
+def main():
+    with open("story.json", "r", encoding="utf-8") as f:
+        story = json.load(f)
+
+    visual_plan = story.get("visual_plan")
+    if not isinstance(visual_plan, list) or len(visual_plan) != 3:
+        die("story.json must include visual_plan with exactly 3 items.")
+
+    windows = {}
+    sizes = render_windows(visual_plan)
+    for i in (1, 2, 3):
+        path = os.path.join(OUT_DIR, f"clip{i}.mp4")
+        window = sizes[i - 1]
+        if not os.path.exists(path):
+            print(f"[analyze] {path} missing, skipping")
+            continue
+
+        t0 = time.perf_counter()
+        duration = probe_duration(path)
+        ts, frames = sample_clip(path, duration, deadline=t0 + ANALYZE_BUDGET_SEC)
+        if len(frames) >= MIN_SAMPLES:
+            pick = best_window(ts, frames, duration, window)
+        else:
+            pick = {"start": 0.0, "score": None}
+        elapsed = time.perf_counter() - t0
+        over_budget = elapsed > ANALYZE_BUDGET_SEC
+        if over_budget:
+            # el presupuesto manda: sin análisis a tiempo, el clip arranca en 0
+            pick = {"start": 0.0, "score": None}
+
+        windows[f"clip{i}"] = {
+            "start": pick["start"],
+            "duration": window,
+            "clip_duration": round(duration, 3),
+            "score": pick["score"],
+            "samples": int(len(frames)),
+            "elapsed_sec": round(elapsed, 3),
+        }
+        print(f"[analyze] clip{i}: start={pick['start']}s of {duration:.1f}s "
+              f"({len(frames)} samples, {elapsed:.2f}s)")
+        if over_budget:
+            print(f"[analyze] WARNING: clip{i} took {elapsed:.2f}s "
+                  f"(budget {ANALYZE_BUDGET_SEC:.2f}s); using start=0")
+
+    with open(WINDOWS_PATH, "w", encoding="utf-8") as f:
+        json.dump(windows, f, indent=2)
+
+    print(f"OK: best windows written to {WINDOWS_PATH}")
+
+if __name__ == "__main__":
+    main()
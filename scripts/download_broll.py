@@ -5,11 +5,20 @@ import re
 import subprocess
 import urllib.parse
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 PEXELS_API_KEY = os.getenv("PEXELS_API_KEY", "").replace("\r", "").replace("\n", "").strip()
 OUT_DIR = os.getenv("BROLL_DIR", "out/broll")
 PEXELS_VIDEO_SEARCH = "https://api.pexels.com/videos/search"
 
+# búsqueda adaptativa: sólo pedimos más páginas si la mejor es mediocre
+# ~1080p vertical a pocos segundos del target ya es "suficiente"
+PEXELS_MIN_SCORE = float(os.getenv("PEXELS_MIN_SCORE", "14.5"))
+# las páginas extra van en olas de PEXELS_PAGE_WORKERS: la siguiente ola
+# sólo sale si la anterior no alcanzó el score
+PEXELS_MAX_PAGES = int(os.getenv("PEXELS_MAX_PAGES", "5"))
+PEXELS_PAGE_WORKERS = int(os.getenv("PEXELS_PAGE_WORKERS", "2"))
+
 STOP_WORDS = {
     "sound", "whispering", "silence", "audio", "voice", "sfx", "music",
     "zoom", "slow", "vibe", "atmosphere", "mood"
@@ -124,16 +133,19 @@ def build_query(words: list[str]) -> str:
         query = random.choice(FALLBACKS)
     return query
 
-def pexels_search(query: str, per_page: int = 18) -> list:
+def pexels_page(query: str, per_page: int = 18, page: int = 1) -> dict:
     params = {
         "query": query,
         "per_page": str(per_page),
+        "page": str(page),
         "orientation": "portrait",  # intentamos vertical
         "size": "large",
     }
     url = PEXELS_VIDEO_SEARCH + "?" + urllib.parse.urlencode(params)
-    data = curl_json(url)
-    return data.get("videos") or []
+    return curl_json(url)
+
+def pexels_search(query: str, per_page: int = 18, page: int = 1) -> list:
+    return pexels_page(query, per_page, page).get("videos") or []
 
 def pick_best_file(video_obj: dict) -> dict:
     """
@@ -213,6 +225,59 @@ def choose_best_video(videos: list, query_words: list[str], target_sec: float) -
     ranked.sort(key=lambda x: x[0], reverse=True)
     return ranked[0][1] if ranked else {}
 
+def best_scored(videos: list, query_words: list[str], target_sec: float) -> tuple[float, dict]:
+    best = (float("-inf"), {})
+    for v in videos:
+        s = score_video(v, query_words, target_sec)
+        if s > best[0]:
+            best = (s, v)
+    return best
+
+def pexels_search_adaptive(query: str, query_words: list[str], target_sec: float, per_page: int = 24) -> list:
+    """
+    Página 1 siempre. Si el mejor score < PEXELS_MIN_SCORE, pide las páginas
+    siguientes (hasta PEXELS_MAX_PAGES) en olas concurrentes de
+    PEXELS_PAGE_WORKERS y corta en cuanto aparece un candidato
+    suficientemente bueno, sin esperar las páginas que quedaron en vuelo.
+    Regresa todos los videos vistos (el caller elige con choose_best_video).
+    """
+    first = pexels_page(query, per_page, 1)
+    videos = first.get("videos") or []
+    best_score, _ = best_scored(videos, query_words, target_sec)
+
+    total = int(first.get("total_results") or 0)
+    last_page = min(PEXELS_MAX_PAGES, max(1, math.ceil(total / per_page)))
+
+    if not videos or best_score >= PEXELS_MIN_SCORE or last_page < 2:
+        print(f"[broll] page 1: {len(videos)} videos, best score {best_score:.2f}")
+        return videos
+
+    print(f"[broll] page 1 best score {best_score:.2f} < {PEXELS_MIN_SCORE}; up to page {last_page}")
+    wave_size = max(1, PEXELS_PAGE_WORKERS)
+    pages = list(range(2, last_page + 1))
+    pool = ThreadPoolExecutor(max_workers=wave_size)
+    try:
+        for i in range(0, len(pages), wave_size):
+            futures = {pool.submit(pexels_search, query, per_page, p): p for p in pages[i:i + wave_size]}
+            for fut in as_completed(futures):
+                try:
+                    page_videos = fut.result()
+                except RuntimeError as e:
+                    # una página extra que falla no debe tumbar lo que ya tenemos
+                    print(f"[broll] page {futures[fut]} failed: {e}")
+                    continue
+                videos.extend(page_videos)
+                score, _ = best_scored(page_videos, query_words, target_sec)
+                print(f"[broll] page {futures[fut]}: {len(page_videos)} videos, best score {score:.2f}")
+                best_score = max(best_score, score)
+                if best_score >= PEXELS_MIN_SCORE:
+                    # lo que siga en vuelo se descarta: no lo esperamos
+                    return videos
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return videos
+
 def main():
     print(f"[broll] PEXELS_API_KEY length: {len(PEXELS_API_KEY)}")
     if len(PEXELS_API_KEY) < 20:
@@ -239,14 +304,14 @@ def main():
         query_words = query.split()
 
         print(f"[broll] Searching Pexels for: {query} (target ~{target_sec}s)")
-        videos = pexels_search(query, per_page=24)
+        videos = pexels_search_adaptive(query, query_words, target_sec, per_page=24)
 
         if not videos:
             fb = random.choice(FALLBACKS)
             print(f"[broll] No results. Fallback search: {fb}")
-            videos = pexels_search(fb, per_page=24)
             query = fb
             query_words = fb.split()
+            videos = pexels_search_adaptive(query, query_words, target_sec, per_page=24)
 
         if not videos:
             die("No Pexels videos found (even fallback).")
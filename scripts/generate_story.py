@@ -1,7 +1,8 @@
 import os
 import json
 import re
-from openai import OpenAI
+
+import openai_budget
 
 MODEL = os.getenv("OPENAI_TEXT_MODEL", "gpt-4o-mini")
 
@@ -183,12 +184,15 @@ def validate_story(data: dict) -> None:
                 raise ValueError(f"Invalid JSON: banned keyword in visual_plan.keywords: {kw}")
 
 
-def call_model(client: OpenAI, prompt: str) -> str:
-    resp = client.responses.create(
+def call_model(client, prompt: str) -> str:
+    resp = openai_budget.run(
+        client.responses.create,
         model=MODEL,
         input=prompt,
         temperature=0.85,
         max_output_tokens=650,
+        tokens=openai_budget.estimate_tokens(prompt, 650),
+        priority=openai_budget.PRIORITY_HIGH,  # todo el pipeline depende de esto
     )
     out_text = ""
     for item in resp.output:
@@ -204,7 +208,7 @@ def main():
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is missing.")
 
-    client = OpenAI(api_key=api_key)
+    client = openai_budget.make_client(api_key)
 
     last_err = None
     data = None
@@ -1,12 +1,25 @@
 import os
 import re
-from openai import OpenAI
+import subprocess
+
+import openai_budget
 
 MAX_CHARS = 14          # por línea (duro)
 MAX_LINES = 2
 MIN_BLOCK_SEC = 0.55    # no tan rápido
 MAX_BLOCK_SEC = 1.80    # no tan lento
 
+# Transcripción por trozos (narraciones largas):
+# "auto" = sólo si el audio pasa de CHUNK_MAX_SEC o del límite de upload
+CHUNKED = os.getenv("SRT_CHUNKED", "auto").strip().lower()
+CHUNK_MIN_SEC = float(os.getenv("SRT_CHUNK_MIN_SEC", "30"))
+CHUNK_MAX_SEC = float(os.getenv("SRT_CHUNK_MAX_SEC", "120"))
+UPLOAD_LIMIT_BYTES = 24 * 1024 * 1024  # whisper acepta 25 MB; dejamos margen
+CHUNK_SR = 16000        # mono 16 kHz: lo que whisper usa internamente
+CHUNK_BITRATE = "32k"   # opus mono: voz clara y ~8x menos bytes que WAV 16 kHz
+FRAME_SEC = 0.02
+PAUSE_SMOOTH_SEC = 0.30  # preferimos pausas largas, no micro-silencios
+
 def sec_to_ts(sec: float) -> str:
     sec = max(0.0, float(sec))
     h = int(sec // 3600)
@@ -107,6 +120,129 @@ def seg_get(seg, key: str, default=None):
 def clamp(val: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, val))
 
+def tr_segments(tr) -> list:
+    return getattr(tr, "segments", None) or (tr.get("segments") if isinstance(tr, dict) else None) or []
+
+def probe_duration(path: str) -> float:
+    out = subprocess.check_output([
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=nk=1:nw=1", path
+    ])
+    try:
+        return float(out.decode().strip())
+    except ValueError:
+        return 0.0
+
+def use_chunked(path: str) -> bool:
+    if CHUNKED in ("1", "true", "yes"):
+        return True
+    if CHUNKED in ("0", "false", "no"):
+        return False
+    if os.path.getsize(path) > UPLOAD_LIMIT_BYTES:
+        return True
+    return probe_duration(path) > CHUNK_MAX_SEC
+
+def decode_mono(path: str):
+    import numpy as np
+    raw = subprocess.check_output([
+        "ffmpeg", "-v", "error", "-i", path,
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(CHUNK_SR), "-"
+    ])
+    return np.frombuffer(raw, dtype=np.int16)
+
+def silence_cuts(pcm) -> list[int]:
+    """
+    Cortes (en muestras) en la pausa más profunda de cada ventana
+    [CHUNK_MIN_SEC, CHUNK_MAX_SEC]: trozos acotados que no parten palabras.
+    """
+    import numpy as np
+    frame = int(FRAME_SEC * CHUNK_SR)
+    n_frames = len(pcm) // frame
+    if n_frames == 0:
+        return [0, len(pcm)]
+
+    x = pcm[: n_frames * frame].astype(np.float32).reshape(n_frames, frame)
+    energy = (x * x).mean(axis=1)
+    k = max(1, int(PAUSE_SMOOTH_SEC / FRAME_SEC))
+    smooth = np.convolve(energy, np.ones(k) / k, mode="same")
+
+    min_f = int(CHUNK_MIN_SEC / FRAME_SEC)
+    max_f = max(min_f + 1, int(CHUNK_MAX_SEC / FRAME_SEC))
+    cuts = [0]
+    cur = 0
+    while n_frames - cur > max_f:
+        lo = cur + min_f
+        # nunca cortar tan tarde que lo que sobra quede < CHUNK_MIN_SEC
+        # (p.ej. el silencio final del TTS): whisper rechaza audio < 0.1 s
+        hi = max(lo + 1, min(cur + max_f, n_frames - min_f))
+        cur = lo + int(np.argmin(smooth[lo:hi]))
+        cuts.append(cur * frame)
+
+    # red de seguridad (CHUNK_MIN_SEC > CHUNK_MAX_SEC / 2): cola corta se une al anterior
+    if len(cuts) > 1 and (len(pcm) - cuts[-1]) < min_f * frame:
+        cuts.pop()
+    cuts.append(len(pcm))
+    return cuts
+
+def encode_chunk(pcm) -> bytes:
+    """Trozo PCM -> ogg/opus mono 16 kHz (compacto para el upload)."""
+    return subprocess.run([
+        "ffmpeg", "-v", "error",
+        "-f", "s16le", "-ar", str(CHUNK_SR), "-ac", "1", "-i", "-",
+        "-c:a", "libopus", "-b:a", CHUNK_BITRATE, "-application", "voip",
+        "-f", "ogg", "-"
+    ], input=pcm.tobytes(), capture_output=True, check=True).stdout
+
+async def transcribe_chunks(client, chunks: list[tuple[float, bytes]]) -> list[dict]:
+    import asyncio
+    sched = openai_budget.get_scheduler()
+    results = await asyncio.gather(*(
+        sched.submit(
+            client.audio.transcriptions.create,
+            model="whisper-1",
+            file=(f"chunk{i:03d}.ogg", data),
+            response_format="verbose_json",
+            language="es",
+        )
+        for i, (_, data) in enumerate(chunks)
+    ))
+
+    # regresa los segmentos a la línea de tiempo del audio completo
+    merged = []
+    for (offset, _), tr in zip(chunks, results):
+        for seg in tr_segments(tr):
+            merged.append({
+                "start": float(seg_get(seg, "start", 0.0)) + offset,
+                "end": float(seg_get(seg, "end", 0.0)) + offset,
+                "text": seg_get(seg, "text", "") or "",
+            })
+    merged.sort(key=lambda s: s["start"])
+    return merged
+
+def transcribe_chunked(client, path: str) -> list[dict]:
+    pcm = decode_mono(path)
+    cuts = silence_cuts(pcm)
+    chunks = [(a / CHUNK_SR, encode_chunk(pcm[a:b])) for a, b in zip(cuts, cuts[1:]) if b > a]
+    print(f"[srt] chunked transcription: {len(chunks)} chunks "
+          f"({len(pcm) / CHUNK_SR:.1f}s audio, max {CHUNK_MAX_SEC:.0f}s each)")
+    import asyncio
+    return asyncio.run(transcribe_chunks(client, chunks))
+
+def transcribe_single(client, path: str) -> list:
+    # bytes en memoria: si hay reintento (429) el archivo no queda consumido
+    with open(path, "rb") as f:
+        audio_bytes = f.read()
+
+    # whisper se limita por RPM, no por tokens
+    tr = openai_budget.run(
+        client.audio.transcriptions.create,
+        model="whisper-1",
+        file=(os.path.basename(path), audio_bytes),
+        response_format="verbose_json",
+        language="es",
+    )
+    return tr_segments(tr)
+
 def main():
     api_key = os.environ.get("OPENAI_API_KEY")
     if not api_key:
@@ -115,17 +251,13 @@ def main():
     if not os.path.exists("voice.mp3"):
         raise RuntimeError("voice.mp3 not found.")
 
-    client = OpenAI(api_key=api_key)
+    client = openai_budget.make_client(api_key)
 
-    with open("voice.mp3", "rb") as f:
-        tr = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=f,
-            response_format="verbose_json",
-            language="es",
-        )
+    if use_chunked("voice.mp3"):
+        segments = transcribe_chunked(client, "voice.mp3")
+    else:
+        segments = transcribe_single(client, "voice.mp3")
 
-    segments = getattr(tr, "segments", None) or (tr.get("segments") if isinstance(tr, dict) else None) or []
     if not segments:
         raise RuntimeError("No transcription segments returned by whisper.")
 
@@ -0,0 +1,233 @@
+import os
+import json
+import hashlib
+import subprocess
+
+import numpy as np
+
+IN_PATH = os.getenv("VOICE_PATH", "voice.mp3")
+CACHE_PATH = os.path.splitext(IN_PATH)[0] + ".loudness.json"
+
+# Shorts/TikTok suelen normalizar alrededor de -14 LUFS
+TARGET_LUFS = float(os.getenv("LOUDNESS_TARGET", "-14"))
+# margen extra por el re-encode a mp3 (los picos se mueven un poco)
+TRUE_PEAK_MAX = float(os.getenv("TRUE_PEAK_MAX", "-1.5"))
+
+SR = 48000  # los coeficientes K-weighting de BS.1770 son para 48 kHz
+BLOCK_SEC = 0.400
+STEP_SEC = 0.100  # 75% overlap
+ABS_GATE = -70.0
+REL_GATE = -10.0
+
+# BS.1770-4, 48 kHz: shelf (pre-filter) + high-pass (RLB)
+K_SHELF = ([1.53512485958697, -2.69169618940638, 1.19839281085285],
+           [1.0, -1.69065929318241, 0.73248077421585])
+K_HIGHPASS = ([1.0, -2.0, 1.0],
+              [1.0, -1.99004745483398, 0.99007225036621])
+
+# BS.1770-4 Anexo 2: FIR polifásico de 48 taps para oversampling x4 (12 por fase)
+TRUE_PEAK_PHASES = (
+    (0.0017089843750, 0.0109863281250, -0.0196533203125, 0.0332031250000,
+     -0.0594482421875, 0.1373291015625, 0.9721679687500, -0.1022949218750,
+     0.0476074218750, -0.0266113281250, 0.0148925781250, -0.0083007812500),
+    (-0.0291748046875, 0.0292968750000, -0.0517578125000, 0.0891113281250,
+     -0.1665039062500, 0.4650878906250, 0.7797851562500, -0.2003173828125,
+     0.1015625000000, -0.0582275390625, 0.0330810546875, -0.0189208984375),
+    (-0.0189208984375, 0.0330810546875, -0.0582275390625, 0.1015625000000,
+     -0.2003173828125, 0.7797851562500, 0.4650878906250, -0.1665039062500,
+     0.0891113281250, -0.0517578125000, 0.0292968750000, -0.0291748046875),
+    (-0.0083007812500, 0.0148925781250, -0.0266113281250, 0.0476074218750,
+     -0.1022949218750, 0.9721679687500, 0.1373291015625, -0.0594482421875,
+     0.0332031250000, -0.0196533203125, 0.0109863281250, 0.0017089843750),
+)
+
+def die(msg: str):
+    raise RuntimeError(msg)
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def probe_channels(path: str) -> int:
+    out = subprocess.check_output([
+        "ffprobe", "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "stream=channels", "-of", "default=nk=1:nw=1", path
+    ])
+    return max(1, int(out.decode().strip() or 1))
+
+def decode(path: str) -> np.ndarray:
+    """
+    Un solo decode: float32 a 48 kHz, shape (canales, muestras).
+    """
+    ch = probe_channels(path)
+    raw = subprocess.check_output([
+        "ffmpeg", "-v", "error", "-i", path,
+        "-f", "f32le", "-acodec", "pcm_f32le", "-ar", str(SR), "-ac", str(ch), "-"
+    ])
+    x = np.frombuffer(raw, dtype=np.float32)
+    x = x[: len(x) - (len(x) % ch)]
+    # float32: la mitad de memoria; el filtrado va por trozos en float64
+    return np.ascontiguousarray(x.reshape(-1, ch).T)
+
+def encode(x: np.ndarray, out_path: str):
+    ch = x.shape[0]
+    pcm = np.ascontiguousarray(x.T, dtype=np.float32).tobytes()
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "f32le", "-ar", str(SR), "-ac", str(ch), "-i", "-",
+        "-c:a", "libmp3lame", "-q:a", "2", out_path
+    ], input=pcm, check=True)
+
+def biquad_response(b, a, n: int) -> np.ndarray:
+    """H(e^jw) en los bins de rfft(n)."""
+    zinv = np.exp(-2j * np.pi * np.arange(n // 2 + 1) / n)
+    num = b[0] + b[1] * zinv + b[2] * zinv ** 2
+    den = a[0] + a[1] * zinv + a[2] * zinv ** 2
+    return num / den
+
+def k_weight_ir(n: int = 1 << 14) -> np.ndarray:
+    """
+    Respuesta al impulso del K-weighting, truncada a n muestras.
+    El polo más lento (~0.995) cae >150 dB en 2^14 muestras: truncar no se nota.
+    """
+    H = biquad_response(*K_SHELF, 2 * n) * biquad_response(*K_HIGHPASS, 2 * n)
+    return np.fft.irfft(H, n=2 * n)[:n]
+
+def k_weighted_step_energy(x: np.ndarray, step: int, chunk_steps: int = 100) -> np.ndarray:
+    """
+    K-weighting por overlap-add en trozos de `chunk_steps` pasos de 100 ms,
+    regresando sólo la energía (suma de cuadrados) por paso: (canales, pasos).
+    Memoria acotada por el trozo, no por la duración del audio.
+    """
+    h = k_weight_ir()
+    n_ch, n_in = x.shape
+    n_steps = n_in // step
+    chunk = chunk_steps * step
+    nfft = 1 << int(np.ceil(np.log2(chunk + len(h) - 1)))
+    Hf = np.fft.rfft(h, n=nfft)
+
+    energy = np.zeros((n_ch, n_steps))
+    tail = np.zeros((n_ch, len(h) - 1))
+    for start in range(0, n_steps * step, chunk):
+        seg = x[:, start:min(start + chunk, n_steps * step)].astype(np.float64)
+        y = np.fft.irfft(np.fft.rfft(seg, n=nfft, axis=1) * Hf, n=nfft, axis=1)
+        y = y[:, : seg.shape[1] + len(h) - 1]
+        y[:, : tail.shape[1]] += tail
+        body = y[:, : seg.shape[1]]
+        tail = y[:, seg.shape[1]:].copy()
+        if tail.shape[1] < len(h) - 1:
+            tail = np.pad(tail, ((0, 0), (0, len(h) - 1 - tail.shape[1])))
+        k = start // step
+        energy[:, k:k + seg.shape[1] // step] = (body * body).reshape(n_ch, -1, step).sum(axis=2)
+    return energy
+
+def integrated_loudness(x: np.ndarray) -> float:
+    """BS.1770: bloques de 400 ms, gate absoluto -70 LUFS y relativo -10 LU."""
+    block = int(BLOCK_SEC * SR)
+    step = int(STEP_SEC * SR)
+    per_block = block // step  # 4 pasos de 100 ms = 75% overlap
+    if x.shape[1] < block:
+        return float("-inf")
+
+    # energía por bloque = suma de 4 pasos consecutivos
+    e = k_weighted_step_energy(x, step)
+    csum = np.concatenate([np.zeros((e.shape[0], 1)), np.cumsum(e, axis=1)], axis=1)
+    n_blocks = e.shape[1] - per_block + 1
+    z = (csum[:, per_block:per_block + n_blocks] - csum[:, :n_blocks]) / block  # (canales, bloques)
+    power = z.sum(axis=0)  # G=1 para L/R/mono
+
+    with np.errstate(divide="ignore"):
+        lk = -0.691 + 10 * np.log10(power)
+
+    gated = power[lk > ABS_GATE]
+    if gated.size == 0:
+        return float("-inf")
+    rel = -0.691 + 10 * np.log10(gated.mean()) + REL_GATE
+    gated = power[(lk > ABS_GATE) & (lk > rel)]
+    if gated.size == 0:
+        return float("-inf")
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+def true_peak(x: np.ndarray, chunk: int = 1 << 20) -> float:
+    """
+    dBTP con el FIR polifásico x4 de BS.1770 (un np.convolve corto por fase).
+    Cada trozo arrastra las últimas muestras del anterior como historia del
+    FIR, así el resultado es idéntico al filtrado continuo: no depende de
+    dónde caen los cortes.
+    """
+    phases = [np.array(h) for h in TRUE_PEAK_PHASES]
+    hist = len(phases[0]) - 1
+    n_in = x.shape[1]
+    peak = float(np.abs(x).max(initial=0.0))
+    for start in range(0, n_in, chunk):
+        lo = max(0, start - hist)
+        seg = x[:, lo:start + chunk].astype(np.float64)
+        keep = slice(start - lo, seg.shape[1])  # salidas de [start, start+chunk)
+        for ch in seg:
+            for h in phases:
+                y = np.convolve(ch, h)[: len(ch)]
+                peak = max(peak, float(np.abs(y[keep]).max(initial=0.0)))
+    return 20 * np.log10(peak) if peak > 0 else float("-inf")
+
+def load_cache() -> dict:
+    if not os.path.exists(CACHE_PATH):
+        return {}
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def main():
+    if not os.path.exists(IN_PATH):
+        die(f"{IN_PATH} not found.")
+
+    digest = sha256_file(IN_PATH)
+    cache = load_cache()
+    if (cache.get("output_sha256") == digest
+            and cache.get("target_lufs") == TARGET_LUFS
+            and cache.get("true_peak_max_dbtp") == TRUE_PEAK_MAX):
+        print(f"OK: {IN_PATH} already normalized ({cache.get('output_lufs')} LUFS), skipping")
+        return
+
+    x = decode(IN_PATH)
+    if x.size == 0:
+        die(f"Could not decode audio from {IN_PATH}.")
+
+    lufs = integrated_loudness(x)
+    tp = true_peak(x)
+    print(f"[loudness] measured: {lufs:.2f} LUFS, true peak {tp:.2f} dBTP")
+
+    if not np.isfinite(lufs):
+        die(f"{IN_PATH} is silent (below gating threshold).")
+
+    gain = TARGET_LUFS - lufs
+    # nunca pasar del techo de true peak: manda el pico, no el target
+    if np.isfinite(tp):
+        gain = min(gain, TRUE_PEAK_MAX - tp)
+
+    tmp_path = IN_PATH + ".tmp.mp3"
+    encode(x * (10 ** (gain / 20)), tmp_path)
+    os.replace(tmp_path, IN_PATH)
+
+    result = {
+        "input_lufs": round(lufs, 2),
+        "input_true_peak_dbtp": round(tp, 2),
+        "gain_db": round(gain, 2),
+        "output_lufs": round(lufs + gain, 2),
+        "output_true_peak_dbtp": round(tp + gain, 2),
+        "target_lufs": TARGET_LUFS,
+        "true_peak_max_dbtp": TRUE_PEAK_MAX,
+        "sample_rate": SR,
+        "output_sha256": sha256_file(IN_PATH),
+    }
+    with open(CACHE_PATH, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"OK: {IN_PATH} normalized (gain {gain:+.2f} dB -> {lufs + gain:.2f} LUFS), cached in {CACHE_PATH}")
+
+if __name__ == "__main__":
+    main()
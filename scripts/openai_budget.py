@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import fcntl
+import random
+import tempfile
+import itertools
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+# asyncio y openai se importan al usarse: un stage que falla rápido
+# (sin story.json / API key) no paga ~0.5 s de imports.
+
+# Presupuesto compartido para TODAS las llamadas a OpenAI de la máquina:
+# las cubetas y el cooldown viven en un archivo con flock, así varios
+# pipelines (procesos distintos) se reparten el mismo RPM/TPM.
+
+
+def budget_settings() -> dict:
+    """
+    Config de env, leída al crear el presupuesto y no al importar:
+    así el worker (stage_worker.py) la toma del env de cada job.
+    Valores por defecto conservadores; súbelos según el tier de la cuenta.
+    """
+    return {
+        "rpm": float(os.getenv("OPENAI_RPM", "300")),
+        "tpm": float(os.getenv("OPENAI_TPM", "150000")),
+        "max_retries": int(os.getenv("OPENAI_MAX_RETRIES", "5")),
+        "backoff_base": float(os.getenv("OPENAI_BACKOFF_BASE", "1.0")),
+        "backoff_max": float(os.getenv("OPENAI_BACKOFF_MAX", "60")),
+        "state_path": os.getenv(
+            "OPENAI_BUDGET_STATE",
+            os.path.join(tempfile.gettempdir(), f"terror-shorts-openai-budget-{os.getuid()}.json"),
+        ),
+    }
+
+# menor = sale antes de la cola
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+
+def estimate_tokens(text: str, max_output_tokens: int = 0) -> int:
+    """
+    Estimación barata (sin tokenizer): ~3 caracteres por token en español,
+    más lo que el modelo puede llegar a generar.
+    """
+    return max(1, len(text or "") // 3) + max(0, int(max_output_tokens))
+
+
+class TokenBucket:
+    """
+    Cubeta clásica: capacidad = presupuesto por minuto, se rellena continuo.
+    Usa reloj de pared (time.time) porque el estado se comparte entre procesos.
+    """
+
+    def __init__(self, per_minute: float, level: float = None, stamp: float = None):
+        self.capacity = max(1.0, float(per_minute))
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity if level is None else min(self.capacity, float(level))
+        self.stamp = time.time() if stamp is None else float(stamp)
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + max(0.0, now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya `amount` disponible (0 = ya)."""
+        self._refill(now)
+        # una petición más grande que la cubeta nunca cabría: la limitamos
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+    def to_dict(self) -> dict:
+        return {"level": self.level, "stamp": self.stamp}
+
+
+# un waiter que no sondea en este tiempo se da por muerto (proceso caído)
+WAITER_STALE_SEC = 5.0
+
+
+class SharedBudget:
+    """
+    Cubetas RPM/TPM + cooldown de 429 + cola de espera, en un archivo JSON
+    bajo flock. Cada admisión es un read-modify-write corto con el lock tomado.
+    La cola es global (todos los procesos): entra primero la menor prioridad,
+    FIFO dentro de la misma prioridad.
+    """
+
+    def __init__(self, path: str = None, rpm: float = None, tpm: float = None):
+        cfg = budget_settings()
+        self.path = path or cfg["state_path"]
+        self.rpm = cfg["rpm"] if rpm is None else rpm
+        self.tpm = cfg["tpm"] if tpm is None else tpm
+
+    @contextmanager
+    def _locked(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "r+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                try:
+                    state = json.loads(f.read() or "{}")
+                except json.JSONDecodeError:
+                    state = {}  # archivo corrupto/truncado: arrancamos lleno
+                req = state.get("requests") or {}
+                tok = state.get("tokens") or {}
+                buckets = {
+                    "requests": TokenBucket(self.rpm, req.get("level"), req.get("stamp")),
+                    "tokens": TokenBucket(self.tpm, tok.get("level"), tok.get("stamp")),
+                    "cooldown_until": float(state.get("cooldown_until") or 0.0),
+                    "waiters": state.get("waiters") if isinstance(state.get("waiters"), dict) else {},
+                }
+                yield buckets
+                f.seek(0)
+                f.truncate()
+                json.dump({
+                    "requests": buckets["requests"].to_dict(),
+                    "tokens": buckets["tokens"].to_dict(),
+                    "cooldown_until": buckets["cooldown_until"],
+                    "waiters": buckets["waiters"],
+                }, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_take(self, waiter: str, priority: int, since: float, cost: float) -> float:
+        """
+        Registra/refresca `waiter` en la cola compartida. Si es el primero de
+        la cola y hay cupo, toma 1 request + `cost` tokens, sale de la cola y
+        regresa 0. Si hay cupo pendiente regresa cuánto esperar; -1 si no es
+        su turno (otro waiter, de cualquier proceso, va antes).
+        """
+        with self._locked() as b:
+            now = time.time()
+            waiters = b["waiters"]
+            for key in [k for k, w in waiters.items() if now - float(w.get("seen", 0)) > WAITER_STALE_SEC]:
+                del waiters[key]
+            waiters[waiter] = {"priority": priority, "since": since, "seen": now}
+
+            head = min(waiters, key=lambda k: (waiters[k]["priority"], waiters[k]["since"], k))
+            if head != waiter:
+                return -1.0
+
+            wait = max(
+                b["cooldown_until"] - now,
+                b["requests"].wait_for(1, now),
+                b["tokens"].wait_for(cost, now),
+                0.0,
+            )
+            if wait == 0.0:
+                b["requests"].take(1, now)
+                b["tokens"].take(cost, now)
+                del waiters[waiter]
+            return wait
+
+    def leave(self, waiter: str):
+        with self._locked() as b:
+            b["waiters"].pop(waiter, None)
+
+    def cool_down(self, delay: float):
+        with self._locked() as b:
+            now = time.time()
+            b["cooldown_until"] = max(b["cooldown_until"], now + delay)
+            # el servidor dice que no hay cupo: vaciamos para no reventar al salir
+            b["requests"].drain(now)
+
+
+def error_code(err: Exception):
+    # APIStatusError expone .code; si no, lo sacamos del body {"error": {"code": ...}}
+    code = getattr(err, "code", None)
+    if code:
+        return code
+    body = getattr(err, "body", None)
+    if isinstance(body, dict):
+        inner = body.get("error") if isinstance(body.get("error"), dict) else body
+        return inner.get("code")
+    return None
+
+
+def is_rate_limit(err: Exception) -> bool:
+    # sin importar openai: RateLimitError trae status_code=429.
+    # insufficient_quota también es 429 pero no se arregla esperando.
+    return getattr(err, "status_code", None) == 429 and error_code(err) != "insufficient_quota"
+
+
+def is_transient(err: Exception) -> bool:
+    # 5xx y fallos de conexión/timeout (APIConnectionError, APITimeoutError)
+    status = getattr(err, "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return type(err).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after_sec(err: Exception):
+    resp = getattr(err, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    for key in ("retry-after-ms", "retry-after"):
+        val = headers.get(key)
+        if not val:
+            continue
+        try:
+            sec = float(val)
+        except ValueError:
+            continue
+        return sec / 1000.0 if key.endswith("-ms") else sec
+    return None
+
+
+class Scheduler:
+    """
+    Admite llamadas respetando RPM y TPM (SharedBudget, entre procesos).
+    - Cola por prioridad compartida entre procesos (FIFO en la misma
+      prioridad): un PRIORITY_HIGH de un pipeline pasa antes que los
+      PRIORITY_NORMAL que esperan en otros.
+    - 429: backoff exponencial (o Retry-After), pausa global y reintento.
+    - 429 insufficient_quota: falla de inmediato (esperar no sirve).
+    - 5xx / conexión: backoff sólo para esa llamada.
+    No depende de un event loop concreto: sirve con varios asyncio.run().
+    """
+
+    def __init__(self, budget: SharedBudget = None, max_retries: int = None):
+        cfg = budget_settings()
+        self.budget = budget or SharedBudget()
+        self.max_retries = cfg["max_retries"] if max_retries is None else max_retries
+        self.backoff_base = cfg["backoff_base"]
+        self.backoff_max = cfg["backoff_max"]
+        self._seq = itertools.count()
+
+    async def acquire(self, cost: float, priority: int = PRIORITY_NORMAL):
+        import asyncio
+        waiter = f"{os.getpid()}-{next(self._seq)}"
+        since = time.time()
+        try:
+            while True:
+                wait = self.budget.try_take(waiter, priority, since, cost)
+                if wait == 0.0:
+                    return
+                # si no es su turno, sondea rápido (y así sigue "vivo" en la
+                # cola); si sí, duerme lo justo
+                await asyncio.sleep(0.05 if wait < 0 else min(wait, 1.0))
+        except BaseException:
+            self.budget.leave(waiter)
+            raise
+
+    def _backoff(self, err: Exception, attempt: int) -> float:
+        delay = retry_after_sec(err)
+        if delay is None:
+            delay = self.backoff_base * (2 ** attempt)
+            delay += random.uniform(0, delay * 0.25)  # jitter
+        delay = min(self.backoff_max, delay)
+        if not is_rate_limit(err):
+            return delay  # error transitorio: sólo espera esta llamada
+        self.budget.cool_down(delay)
+        return delay
+
+    async def submit(self, fn, *args, tokens: int = 0, priority: int = PRIORITY_NORMAL, **kwargs):
+        """
+        Corre fn(*args, **kwargs) (bloqueante, cliente sync de OpenAI) en un hilo
+        cuando el presupuesto lo permite. Reintenta 429 y errores transitorios.
+        """
+        import asyncio
+        attempt = 0
+        while True:
+            await self.acquire(tokens, priority)
+            try:
+                return await asyncio.to_thread(fn, *args, **kwargs)
+            except Exception as e:
+                if not (is_rate_limit(e) or is_transient(e)) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(e, attempt)
+                attempt += 1
+                reason = "429 rate limited" if is_rate_limit(e) else f"transient error ({type(e).__name__})"
+                print(f"[openai] {reason}; retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                if not is_rate_limit(e):
+                    await asyncio.sleep(delay)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
+
+
+def run(fn, *args, tokens: int = 0, priority: int = PRIORITY_NORMAL, **kwargs):
+    """Atajo síncrono para los scripts: una llamada, presupuestada."""
+    import asyncio
+    return asyncio.run(get_scheduler().submit(fn, *args, tokens=tokens, priority=priority, **kwargs))
+
+
+@lru_cache(maxsize=None)
+def make_client(api_key: str):
+    """
+    Cliente OpenAI SIN reintentos propios: 429/5xx los maneja el Scheduler,
+    así no se duplican reintentos ni se salta el presupuesto.
+    Cacheado por key: en el worker (stage_worker.py) el pool HTTP queda tibio.
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, max_retries=0)
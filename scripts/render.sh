@@ -34,6 +34,9 @@ print(max(0.1, d - d1 - d2))
 PY
 )}"
 
+# voice.mp3 ya viene normalizado (scripts/normalize_audio.py):
+# amix con normalize=0 para NO bajarle el nivel al mezclar con el ambiente.
+
 # Subtítulos: lower-third con caja semitransparente (NO tapa todo)
 # OJO: FontSize=12 es muy chico para 1080x1920; si lo ves chico súbelo a 34–44.
 SUB_STYLE="FontName=Arial,FontSize=12,PrimaryColour=&H00FFFFFF&,OutlineColour=&H00000000&,BorderStyle=3,Outline=0,Shadow=0,BackColour=&H33000000&,Alignment=2,MarginV=170,MarginL=140,MarginR=140,WrapStyle=2"
@@ -42,6 +45,22 @@ B1="out/broll/clip1.mp4"
 B2="out/broll/clip2.mp4"
 B3="out/broll/clip3.mp4"
 
+# Offsets de la mejor ventana por clip (scripts/analyze_broll.py); 0 si no hay análisis
+WINDOWS="out/broll/windows.json"
+read_offset() {
+  python - "$WINDOWS" "$1" <<'PY'
+import json, sys
+try:
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        print(float(json.load(f).get(sys.argv[2], {}).get("start") or 0))
+except (OSError, ValueError, AttributeError):
+    print(0)
+PY
+}
+O1="${O1:-$(read_offset clip1)}"
+O2="${O2:-$(read_offset clip2)}"
+O3="${O3:-$(read_offset clip3)}"
+
 use_broll=true
 if [[ ! -f "$B1" || ! -f "$B2" || ! -f "$B3" ]]; then
   echo "[render] Missing b-roll clips in out/broll/. Falling back to black background."
@@ -50,9 +69,9 @@ fi
 
 if [[ "$use_broll" == "true" ]]; then
   ffmpeg -y \
-    -stream_loop -1 -i "$B1" \
-    -stream_loop -1 -i "$B2" \
-    -stream_loop -1 -i "$B3" \
+    -ss "$O1" -stream_loop -1 -i "$B1" \
+    -ss "$O2" -stream_loop -1 -i "$B2" \
+    -ss "$O3" -stream_loop -1 -i "$B3" \
     -i voice.mp3 \
     -f lavfi -i "anoisesrc=color=white:amplitude=0.02:d=${DURATION}" \
     -filter_complex "\
@@ -63,7 +82,7 @@ if [[ "$use_broll" == "true" ]]; then
       [base]subtitles=subs.srt:original_size=1080x1920:force_style='${SUB_STYLE}'[v]; \
       [3:a]aformat=fltp:44100:stereo,volume=1.0[voice]; \
       [4:a]aformat=fltp:44100:stereo,volume=0.18[amb]; \
-      [voice][amb]amix=inputs=2:duration=first[a] \
+      [voice][amb]amix=inputs=2:duration=first:normalize=0[a] \
     " \
     -map "[v]" -map "[a]" \
     -t "${AUDIO_DUR}" \
@@ -80,7 +99,7 @@ else
       [base]subtitles=subs.srt:original_size=1080x1920:force_style='${SUB_STYLE}'[v]; \
       [1:a]aformat=fltp:44100:stereo,volume=1.0[voice]; \
       [2:a]aformat=fltp:44100:stereo,volume=0.18[amb]; \
-      [voice][amb]amix=inputs=2:duration=first[a] \
+      [voice][amb]amix=inputs=2:duration=first:normalize=0[a] \
     " \
     -map "[v]" -map "[a]" \
     -t "${AUDIO_DUR}" \
@@ -89,4 +108,4 @@ else
     "${OUT}"
 fi
 
-echo "OK: ${OUT} generated (AUDIO_DUR=${AUDIO_DUR}s, DURATION=${DURATION}s, D1=${D1}, D2=${D2}, D3=${D3})"
+echo "OK: ${OUT} generated (AUDIO_DUR=${AUDIO_DUR}s, DURATION=${DURATION}s, D1=${D1}, D2=${D2}, D3=${D3}, O1=${O1:-0}, O2=${O2:-0}, O3=${O3:-0})"
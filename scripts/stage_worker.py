@@ -0,0 +1,271 @@
+"""
+Worker local para correr los stages con el intérprete tibio.
+
+  python scripts/stage_worker.py serve            # deja el worker escuchando
+  python scripts/stage_worker.py run make_srt     # manda un job (cwd + env actuales)
+  python scripts/stage_worker.py probe make_srt   # sólo imports + cliente, sin correr main()
+  python scripts/stage_worker.py bench            # cold vs warm por stage
+
+El worker mantiene importados los módulos (openai/httpx/pydantic, numpy)
+y hace fork por job: cada hijo aplica el env y cwd del cliente, recarga el
+stage (su config se lee del env al importar) y corre main() con fd 1/2
+capturados, así también llega la salida de curl/ffmpeg. Los jobs corren en
+paralelo; el presupuesto de OpenAI se comparte vía openai_budget.
+Si no hay worker escuchando, `run` corre el stage en este mismo proceso.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import importlib
+import traceback
+import subprocess
+import socketserver
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.getenv(
+    "STAGE_WORKER_SOCKET",
+    os.path.join(tempfile.gettempdir(), f"terror-shorts-{os.getuid()}.sock"),
+)
+
+STAGES = (
+    "generate_story",
+    "download_broll",
+    "analyze_broll",
+    "tts_openai",
+    "normalize_audio",
+    "make_srt",
+)
+
+# lo que cada stage importa tarde en un run real (job "probe" / bench "ready")
+HEAVY = {
+    "generate_story": ("openai",),
+    "download_broll": (),
+    "analyze_broll": ("numpy",),
+    "tts_openai": ("openai",),
+    "normalize_audio": ("numpy",),
+    "make_srt": ("openai",),
+}
+
+def die(msg: str):
+    raise RuntimeError(msg)
+
+def warm_up():
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    for name in STAGES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            # p.ej. sin numpy: ese stage fallará al correr, el resto sigue tibio
+            print(f"[worker] could not preload {name}: {e}", file=sys.stderr)
+    # lo caro que los stages importan tarde
+    for heavy in sorted({h for hs in HEAVY.values() for h in hs} | {"asyncio"}):
+        try:
+            importlib.import_module(heavy)
+        except ImportError:
+            pass
+    # con la key del worker el cliente (y su pool HTTP) nace en el padre
+    # y los hijos lo heredan; con otra key cada job arma el suyo
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if api_key:
+        try:
+            importlib.import_module("openai_budget").make_client(api_key)
+        except ImportError:
+            pass
+
+def prepare_stage(stage: str, probe: bool = False):
+    """
+    Recarga el stage con el env ya aplicado: sus constantes de config
+    (PEXELS_API_KEY, VOICE_PATH, INCLUDE_CTA_AUDIO, ...) salen del env del job.
+    Los módulos pesados siguen en sys.modules, así que recargar es barato.
+    """
+    module = importlib.reload(importlib.import_module(stage))
+    if probe:
+        # lo mismo que paga un run real antes del 1er request, sin red
+        for heavy in HEAVY[stage]:
+            importlib.import_module(heavy)
+        if "openai" in HEAVY[stage]:
+            importlib.import_module("openai_budget").make_client("sk-bench")
+    return module
+
+def run_job(job: dict) -> dict:
+    """
+    Corre en el hijo del fork: env, cwd y fds son sólo de este job.
+    """
+    stage = str(job.get("stage"))
+    if stage not in STAGES:
+        return {"ok": False, "output": "", "error": f"unknown stage: {stage}"}
+
+    t0 = time.perf_counter()
+    env = job.get("env")
+    if isinstance(env, dict):
+        os.environ.clear()
+        os.environ.update({str(k): str(v) for k, v in env.items()})
+
+    with tempfile.TemporaryFile() as out:
+        # fd 1/2 -> archivo: captura prints Y la salida de curl/ffmpeg
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(out.fileno(), 1)
+        os.dup2(out.fileno(), 2)
+        try:
+            os.chdir(str(job.get("cwd") or os.getcwd()))
+            module = prepare_stage(stage, probe=bool(job.get("probe")))
+            if not job.get("probe"):
+                module.main()
+            ok, error = True, ""
+        except BaseException as e:  # SystemExit incluido: el hijo responde igual
+            ok, error = False, "".join(traceback.format_exception_only(type(e), e)).strip()
+            traceback.print_exc()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        out.seek(0)
+        output = out.read().decode("utf-8", errors="replace")
+
+    return {"ok": ok, "output": output, "error": error,
+            "elapsed": round(time.perf_counter() - t0, 4)}
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            job = json.loads(self.rfile.readline().decode("utf-8"))
+            if not isinstance(job, dict):
+                raise ValueError("job must be an object")
+            result = run_job(job)
+        except ValueError as e:
+            result = {"ok": False, "output": "", "error": f"bad job: {e}"}
+        self.wfile.write((json.dumps(result) + "\n").encode("utf-8"))
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    # un hijo por job: cwd/env/fds aislados y jobs en paralelo
+    pass
+
+def serve(path: str = SOCKET_PATH):
+    t0 = time.perf_counter()
+    warm_up()
+    print(f"[worker] warm in {time.perf_counter() - t0:.2f}s")
+
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            try:
+                s.connect(path)
+            except ConnectionRefusedError:
+                os.unlink(path)  # socket viejo de un worker muerto
+            except FileNotFoundError:
+                pass
+            else:
+                die(f"[worker] another worker is already listening on {path}")
+    with Server(path, JobHandler) as srv:
+        os.chmod(path, 0o600)  # los jobs traen API keys en el env
+        print(f"[worker] listening on {path}")
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+def send_job(job: dict, path: str = SOCKET_PATH):
+    """Regresa el resultado del worker, o None si no hay worker escuchando."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+            s.sendall((json.dumps(job) + "\n").encode("utf-8"))
+            with s.makefile("rb") as f:
+                line = f.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+    if not line:
+        die("[worker] connection closed without a result.")
+    return json.loads(line.decode("utf-8"))
+
+def run(stage: str, probe: bool = False) -> int:
+    job = {"stage": stage, "cwd": os.getcwd(), "env": dict(os.environ), "probe": probe}
+    result = send_job(job)
+    if result is None:
+        print(f"[worker] no worker at {SOCKET_PATH}; running {stage} in-process", file=sys.stderr)
+        if stage not in STAGES:
+            die(f"unknown stage: {stage}")
+        if SCRIPTS_DIR not in sys.path:
+            sys.path.insert(0, SCRIPTS_DIR)
+        module = prepare_stage(stage, probe=probe)
+        if not probe:
+            module.main()
+        return 0
+    sys.stdout.write(result["output"])
+    if not result["ok"]:
+        print(f"[worker] {stage} failed: {result['error']}", file=sys.stderr)
+        return 1
+    return 0
+
+def timed(cmd: list[str], cwd: str, env: dict) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+def bench(repeat: int = 5):
+    """
+    Costo fijo por lanzamiento de cada stage (mediana de `repeat` corridas),
+    siempre comparando el mismo trabajo en frío y contra el worker:
+    - fail-fast: el stage en un dir vacío y sin keys (falla en su 1er check)
+    - ready: importa el stage + sus imports tardíos y arma el cliente OpenAI,
+      lo que paga un run real antes del 1er request (sin red). En frío es
+      un proceso nuevo; tibio es el job "probe" del worker.
+    Las columnas tibias incluyen el arranque del cliente `run` y el fork.
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "PEXELS_API_KEY")}
+    me = os.path.abspath(__file__)
+    with tempfile.TemporaryDirectory() as work:
+        sock = os.path.join(work, "worker.sock")
+        env["STAGE_WORKER_SOCKET"] = sock
+        worker = subprocess.Popen(
+            [sys.executable, me, "serve"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            for _ in range(300):
+                if os.path.exists(sock):
+                    break
+                time.sleep(0.05)
+            else:
+                die("[bench] worker did not start.")
+
+            mid = repeat // 2
+            median = lambda cmd: sorted(timed(cmd, work, env) for _ in range(repeat))[mid]
+            print(f"{'stage':<16} {'fail-fast':>18} {'ready':>18}   (seconds)")
+            print(f"{'':<16} {'cold':>8} {'warm':>9} {'cold':>8} {'warm':>9}")
+            for stage in STAGES:
+                ready_code = (
+                    f"import sys; sys.path.insert(0, {SCRIPTS_DIR!r}); "
+                    f"import stage_worker; stage_worker.prepare_stage({stage!r}, probe=True)"
+                )
+                cold_ff = median([sys.executable, os.path.join(SCRIPTS_DIR, f"{stage}.py")])
+                warm_ff = median([sys.executable, me, "run", stage])
+                cold_ready = median([sys.executable, "-c", ready_code])
+                warm_ready = median([sys.executable, me, "probe", stage])
+                print(f"{stage:<16} {cold_ff:>8.3f} {warm_ff:>9.3f} {cold_ready:>8.3f} {warm_ready:>9.3f}")
+        finally:
+            worker.terminate()
+            worker.wait()
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ("serve", "run", "probe", "bench"):
+        die("usage: stage_worker.py serve | run <stage> | probe <stage> | bench")
+
+    if args[0] == "serve":
+        serve()
+    elif args[0] in ("run", "probe"):
+        if len(args) != 2:
+            die(f"usage: stage_worker.py {args[0]} <stage>")
+        sys.exit(run(args[1], probe=args[0] == "probe"))
+    else:
+        bench()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import os
 import json
 import re
-from openai import OpenAI
+
+import openai_budget
 
 TTS_MODEL = os.getenv("OPENAI_TTS_MODEL", "gpt-4o-mini-tts")
 VOICE = os.getenv("OPENAI_TTS_VOICE", "alloy")
@@ -24,7 +25,7 @@ def main():
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is missing.")
 
-    client = OpenAI(api_key=api_key)
+    client = openai_budget.make_client(api_key)
 
     with open("story.json", "r", encoding="utf-8") as f:
         story = json.load(f)
@@ -52,11 +53,13 @@ def main():
             # pausa más larga antes del CTA
             text = text + "\n\n…\n\n" + cta
 
-    audio = client.audio.speech.create(
+    audio = openai_budget.run(
+        client.audio.speech.create,
         model=TTS_MODEL,
         voice=VOICE,
         input=text,
         response_format="mp3",
+        tokens=openai_budget.estimate_tokens(text),
     )
 
     with open("voice.mp3", "wb") as f: